@@ -3,13 +3,11 @@ __author__ = 'schlitzer'
 import argparse
 import codecs
 import configparser
-from collections import deque
 import glob
-import json
+import io
 import os
 import signal
 import sys
-import syslog
 import time
 import logging
 from logging.handlers import TimedRotatingFileHandler, SysLogHandler
@@ -20,7 +18,13 @@ import jsonschema.exceptions
 from pep3143daemon import DaemonContext, PidFile
 
 # project
+from pylogchop.batching import Batcher
+from pylogchop.filters import LineFilter
+from pylogchop.parsers import create_parser
+from pylogchop.poller import Poller
+from pylogchop.scheduler import FairScheduler
 from pylogchop.schemas import *
+from pylogchop.sinks import NdjsonSink, create_sink
 from pylogchop.worker import Worker
 
 
@@ -50,6 +54,15 @@ def main():
     start_parser = subparsers.add_parser('start', help='Start PyLogChop')
     start_parser.set_defaults(method='start')
 
+    process_parser = subparsers.add_parser('process', help='Process a file once and exit')
+    process_parser.set_defaults(method='process')
+    process_parser.add_argument("--source", dest="source", action="store", required=True,
+                                help="Source section to take parsing and template settings from")
+    process_parser.add_argument("--sink", dest="sink", action="store", default=None,
+                                help="Sink to send events to, defaults to NDJSON on stdout")
+    process_parser.add_argument("file", action="store",
+                                help="File to process, - for stdin")
+
     parsed_args = parser.parse_args()
 
     if parsed_args.method == 'quit':
@@ -76,15 +89,33 @@ def main():
         )
         pylogchopapi.start()
 
+    elif parsed_args.method == 'process':
+        pylogchopapi = PyLogChop(
+            cfg=parsed_args.cfg,
+            pid=parsed_args.pid,
+            nodaemon=parsed_args.nodaemon
+        )
+        pylogchopapi.process(
+            source=parsed_args.source,
+            file=parsed_args.file,
+            sink=parsed_args.sink
+        )
+
 
 class PyLogChop(object):
     def __init__(self, cfg, pid, nodaemon):
         self._config_file = cfg
         self._config = configparser.ConfigParser()
         self._config_dict = None
-        self._deque = deque()
+        self._batcher = Batcher()
+        self._poller = Poller()
+        self._scheduler = FairScheduler()
         self._pid = pid
         self._nodaemon = nodaemon
+        self._sinks = dict()
+        self._sinks_conf = dict()
+        self._sinks_retired = []
+        self._stats_next = time.time()
         self._terminate = False
         self._worker = dict()
         self.log = logging.getLogger('pylogchop')
@@ -183,67 +214,79 @@ class PyLogChop(object):
                     pass
         return result
 
-    @staticmethod
-    def _shrink_list(msg):
-        last_line = msg.pop()
-        if last_line == '...':
-            last_line = msg.pop()
-        if len(last_line) > 3:
-            msg.append("...")
-
-    @staticmethod
-    def _shrink_dict(msg):
-        cut = 6
-        fieldlen = { field: len(json.dumps(msg[field])) for field in msg}
-        fieldlen_list = sorted(fieldlen.items(), key=lambda item: item[1])
-        field_key, field_len = fieldlen_list.pop()
-        if isinstance(msg[field_key], str):
-            msg[field_key] = msg[field_key][0:-cut] + "..."
-        elif isinstance(msg[field_key], dict):
-            msg[field_key] = PyLogChop._shrink_dict(msg[field_key])
-        elif isinstance(msg[field_key], list):
-            PyLogChop._shrink_list(msg[field_key])
-        else:
-            raise ValueError("could not shrink field {} with type {}".format(field_key, type(msg[field_key])))
-        return msg
-
-    def _shrink(self, msg):
-        max_length = int(self.config.get('main', 'max_length', fallback=31000))
-        cut = 6
-        msgjson = json.dumps(msg) # ensure_ascii=False)
-        msgsize = len(msgjson)
-        while msgsize >= max_length:
-            if isinstance(msg, list):
-                self._shrink_list(msg)
-            elif isinstance(msg, dict):
-                self._shrink_dict(msg)
-            elif isinstance(msg, str):
-                msg[field_key] = msg[field_key][0:-cut-3] + "..."
-                break
+    def _send_messages(self, flush=False):
+        retired, self._sinks_retired = self._sinks_retired, []
+        for sink in retired:
+            sink.close()
+        messages = self._scheduler.popmany(1000)
+        batches = {}
+        for msg in messages:
+            config = msg.config
+            if config.batch and config.sink in self._sinks:
+                ready = self._batcher.add(msg, self._sinks[config.sink])
+                for batch in ready:
+                    batches.setdefault(batch.config.sink, []).append(batch)
             else:
-                raise ValueError("could not ")
-            msgjson = json.dumps(msg)
-            msgsize = len(msgjson)
-        return msgjson
+                batches.setdefault(config.sink, []).append(msg)
+        if flush:
+            ready = self._batcher.drain()
+        else:
+            ready = self._batcher.expired()
+        for batch in ready:
+            batches.setdefault(batch.config.sink, []).append(batch)
+        for name, batch in batches.items():
+            try:
+                self._sinks[name].send(batch)
+            except KeyError:
+                self.log.error("dropping {0} messages for unknown sink {1}".format(len(batch), name))
+        self._scheduler.record_lag(messages)
+        for sink in self._sinks.values():
+            sink.tick()
+        return len(messages)
+
+    def _log_stats(self):
+        interval = int(self.config.get('main', 'stats_interval', fallback=60))
+        now = time.time()
+        if not interval or now < self._stats_next:
+            return
+        self._stats_next = now + interval
+        for source, stats in sorted(self._scheduler.stats(reset=True).items()):
+            self.log.info(
+                "queue {0}: depth={1} dequeued={2} wait_avg={3:.3f}s wait_max={4:.3f}s "
+                "lag_avg={5:.3f}s lag_max={6:.3f}s event_size={7}B queue_size={8}B".format(
+                    source, stats['depth'], stats['dequeued'], stats['wait_avg'], stats['wait_max'],
+                    stats['lag_avg'], stats['lag_max'], stats['event_size'], stats['queue_size']
+                )
+            )
+        for source, _worker in sorted(self._worker.items()):
+            if _worker.slow_match_count:
+                self.log.info("regex {0}: slow_matches={1} degraded={2} recent={3}".format(
+                    source, _worker.slow_match_count,
+                    bool(_worker.regex_pattern and not _worker.regex),
+                    list(_worker.slow_matches)
+                ))
+            if not _worker.line_filter:
+                continue
+            self.log.info("filter {0}: dropped={1}".format(source, _worker.line_filter.dropped))
+            for action, kind, value, hits in _worker.line_filter.stats():
+                self.log.info("filter {0}: {1} {2}:{3} hits={4}".format(source, action, kind, value, hits))
 
     def _process_message(self):
         try:
-            msg = self._deque.popleft()
-            tag = msg['tag']
-            facility = msg['facility']
-            severity = msg['severity']
-            syslog.openlog(tag, 0, getattr(syslog, facility))
-            syslog.syslog(getattr(syslog, severity), self._shrink(msg['payload']))
-            syslog.closelog()
-            return True
-        except IndexError:
+            self._log_stats()
+        except Exception as err:
+            self.log.error("could not log stats: {0}".format(err))
+        if not self._send_messages():
             time.sleep(0.1)
             return False
+        return True
 
     def _reload(self, sig, frm):
         self.log.info("reloading configuration")
         if not self._cfg_open():
             return
+        self._sinks_start()
+        self._poller_cfg()
         for section in self._config_dict.keys():
             if section.endswith(':source'):
                 if section in self._worker:
@@ -255,6 +298,7 @@ class PyLogChop(object):
             if section not in self._config_dict.keys():
                 self._worker_stop(section)
                 self._worker_join(section)
+                self._scheduler.unregister(section)
                 term.append(section)
         for _worker in term:
             self._worker.pop(_worker)
@@ -271,6 +315,9 @@ class PyLogChop(object):
                 self._app_logging()
 
         self.log.info("starting up")
+        self._sinks_start()
+        self._poller_cfg()
+        self._poller.start()
         for section in self._config_dict.keys():
             if section.endswith(':source'):
                 self._worker_start(section)
@@ -284,30 +331,72 @@ class PyLogChop(object):
         for _worker in self._worker.keys():
             self._worker_join(_worker)
         self.log.info("all worker threads gone")
+        self._poller.stop()
+        self._poller.join()
         self.log.info("cleanup up message queue")
         while True:
-            if not self._process_message():
+            if not self._send_messages(flush=True):
                 break
+        self.log.info("closing sinks")
+        for sink in self._sinks.values():
+            sink.close()
         self.log.info("successfully shutdown")
 
     def _quit(self, sig, frm):
         self.log.info("prepering shutdown")
         self._terminate = True
 
+    def _poller_cfg(self):
+        self._poller.min_interval = float(self.config.get('main', 'poll_interval_min', fallback=0.25))
+        self._poller.max_interval = float(self.config.get('main', 'poll_interval_max', fallback=1.0))
+        self._poller.retry_interval = float(self.config.get('main', 'poll_retry_interval', fallback=10.0))
+
+    def _sinks_start(self):
+        max_length = int(self.config.get('main', 'max_length', fallback=31000))
+        sinks = {'syslog': {'type': 'syslog'}}
+        for section, conf in self._config_dict.items():
+            if not section.endswith(':sink'):
+                continue
+            name = section[:-len(':sink')]
+            sink_type = conf.get('type')
+            if sink_type not in CHECK_CONFIG_SINK:
+                self.log.error("skipping sink {0} because of unknown type {1}".format(name, sink_type))
+                continue
+            try:
+                jsonschema.validate(conf, CHECK_CONFIG_SINK[sink_type])
+            except jsonschema.exceptions.ValidationError as err:
+                self.log.error("defect config for sink {0} \n{1}".format(name, err))
+                continue
+            sinks[name] = conf
+        new_sinks = {}
+        for name, conf in sinks.items():
+            if name in self._sinks and self._sinks_conf[name] == (conf, max_length):
+                new_sinks[name] = self._sinks[name]
+                continue
+            self.log.info("starting sink: {0}".format(name))
+            new_sinks[name] = create_sink(name, conf, max_length)
+        for name, sink in self._sinks.items():
+            if new_sinks.get(name) is not sink:
+                self.log.info("retiring sink: {0}".format(name))
+                self._sinks_retired.append(sink)
+        self._sinks = new_sinks
+        self._sinks_conf = {name: (conf, max_length) for name, conf in sinks.items()}
+
     def _worker_cfg_ok(self, source):
         self.log.info("checking config for {0}".format(source))
         try:
             jsonschema.validate(self._config_dict[source], CHECK_CONFIG_SOURCE)
-            self.log.info("done checking config for {0}".format(source))
-            return True
         except jsonschema.exceptions.ValidationError as err:
             self.log.error("defect config for {0} \n{1}".format(source, err))
-
-    def _worker_start(self, source):
-        self.log.info("starting worker: {0}".format(source))
-        if not self._worker_cfg_ok(source):
-            self.log.error("skipping worker {0} because of broken configuration".format(source))
             return
+        sink = self._config_dict[source].get('sink', 'syslog')
+        if sink not in self._sinks:
+            self.log.error("defect config for {0} \nunknown sink {1}".format(source, sink))
+            return
+        self.log.info("done checking config for {0}".format(source))
+        return True
+
+    def _worker_create(self, source):
         file = source.rstrip(':source')
         conf = self._config_dict[source]
         encoding = conf.get('encoding', 'utf-8')
@@ -316,16 +405,56 @@ class PyLogChop(object):
         except LookupError:
             self.log.fatal("encoding {0} not found for source {1}: not starting worker".format(encoding, source))
             return
-        _worker = Worker(
-            file=file, msgqueue=self._deque,
+        return Worker(
+            file=file,
+            msgqueue=self._scheduler.register(
+                source,
+                weight=conf.get('weight', 1),
+                priority=conf.get('priority', 0)
+            ),
             tags=conf['tags'],
             template=conf['template'],
             syslog_facility=conf['syslog_facility'],
             syslog_severity=conf['syslog_severity'],
             syslog_tag=conf['syslog_tag'],
-            regex=conf['regex'],
-            encoding=encoding
+            regex=conf.get('regex', ''),
+            encoding=encoding,
+            sink=conf.get('sink', 'syslog'),
+            parser=self._worker_parser(conf),
+            timestamp_format=conf.get('timestamp_format', 'iso8601'),
+            source=source,
+            line_filter=self._worker_filter(source),
+            batch=conf.get('batch', 0),
+            batch_linger=conf.get('batch_linger', 0.2),
+            max_line_length=conf.get('max_line_length', 0),
+            regex_timeout=conf.get('regex_timeout', 0),
+            slow_match=conf.get('slow_match', 0.05),
+            max_slow_matches=conf.get('max_slow_matches', 0),
+            poller=self._poller
+        )
+
+    @staticmethod
+    def _worker_parser(conf):
+        return create_parser(
+            conf.get('parser', 'regex'),
+            csv_fields=conf.get('csv_fields', ''),
+            csv_delimiter=conf.get('csv_delimiter', ',')
         )
+
+    def _worker_filter(self, source):
+        return LineFilter(
+            include=self.config.get(source, 'include', fallback=''),
+            exclude=self.config.get(source, 'exclude', fallback='')
+        )
+
+    def _worker_start(self, source):
+        self.log.info("starting worker: {0}".format(source))
+        if not self._worker_cfg_ok(source):
+            self.log.error("skipping worker {0} because of broken configuration".format(source))
+            return
+        _worker = self._worker_create(source)
+        if not _worker:
+            return
         _worker.start()
         self._worker[source] = _worker
         self.log.info("worker: {0} running".format(source))
@@ -355,7 +484,26 @@ class PyLogChop(object):
         _worker.syslog_facility = conf['syslog_facility']
         _worker.syslog_severity = conf['syslog_severity']
         _worker.syslog_tag = conf['syslog_tag']
-        _worker.regex = conf['regex']
+        _worker.max_line_length = conf.get('max_line_length', 0)
+        _worker.slow_match = conf.get('slow_match', 0.05)
+        _worker.max_slow_matches = conf.get('max_slow_matches', 0)
+        _worker.regex_timeout = conf.get('regex_timeout', 0)
+        _worker.regex = conf.get('regex', '')
+        _worker.parser = self._worker_parser(conf)
+        _worker.timestamp_format = conf.get('timestamp_format', 'iso8601')
+        _worker.batch = conf.get('batch', 0)
+        _worker.batch_linger = conf.get('batch_linger', 0.2)
+        line_filter = self._worker_filter(source)
+        if not _worker.line_filter or \
+                (_worker.line_filter.include_rules, _worker.line_filter.exclude_rules) != \
+                (line_filter.include_rules, line_filter.exclude_rules):
+            _worker.line_filter = line_filter
+        _worker.sink = conf.get('sink', 'syslog')
+        self._scheduler.register(
+            source,
+            weight=conf.get('weight', 1),
+            priority=conf.get('priority', 0)
+        )
         self.log.info("done reloading configuration for worker {0}".format(source))
 
     def _worker_join(self, source):
@@ -394,6 +542,68 @@ class PyLogChop(object):
             time.sleep(0.5)
         print("Gone")
 
+    def process(self, source, file, sink=None):
+        console_log = logging.StreamHandler()
+        console_log.setLevel('WARNING')
+        self.log.addHandler(console_log)
+        self.log.setLevel('WARNING')
+        if not self._cfg_open():
+            print("could not process config", file=sys.stderr)
+            sys.exit(1)
+        if not source.endswith(':source'):
+            source = "{0}:source".format(source)
+        if source not in self._config_dict:
+            print("no such source: {0}".format(source), file=sys.stderr)
+            sys.exit(1)
+        self._sinks_start()
+        if sink is None:
+            sink = '-'
+            self._sinks[sink] = NdjsonSink(
+                sink, file='-',
+                max_length=int(self.config.get('main', 'max_length', fallback=31000))
+            )
+        elif sink not in self._sinks:
+            print("no such sink: {0}".format(sink), file=sys.stderr)
+            sys.exit(1)
+        if not self._worker_cfg_ok(source):
+            sys.exit(1)
+        _worker = self._worker_create(source)
+        if not _worker:
+            sys.exit(1)
+        _worker.sink = sink
+        if file == '-':
+            fd = io.TextIOWrapper(sys.stdin.buffer, encoding=_worker.encoding, errors='ignore', newline='')
+        else:
+            try:
+                fd = open(file, 'r', encoding=_worker.encoding, errors='ignore', newline='')
+            except OSError as err:
+                print("could not open {0}: {1}".format(file, err), file=sys.stderr)
+                sys.exit(1)
+        lines = 0
+        events = 0
+        started = time.time()
+        with fd:
+            for line in fd:
+                lines += 1
+                _worker.process_line(line)
+                if len(_worker.msgqueue) >= 1000:
+                    events += self._send_messages()
+        _worker.flush()
+        while True:
+            count = self._send_messages(flush=True)
+            if not count:
+                break
+            events += count
+        for _sink in self._sinks.values():
+            _sink.close()
+        elapsed = max(time.time() - started, 1e-9)
+        print(
+            "processed {0} lines, {1} events in {2:.3f}s ({3:.0f} lines/s, {4:.0f} events/s)".format(
+                lines, events, elapsed, lines / elapsed, events / elapsed
+            ),
+            file=sys.stderr
+        )
+
     def reload(self):
         try:
             pid = open(self.pid).readline()
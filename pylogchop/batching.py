@@ -0,0 +1,81 @@
+__author__ = 'schlitzer'
+# stdlib
+import json
+import time
+
+
+class EventBatch(object):
+    __slots__ = ('config', 'items', 'size', 'created', 'max_length')
+
+    def __init__(self, config, max_length):
+        self.config = config
+        self.items = []
+        self.size = 2
+        self.created = time.time()
+        self.max_length = max_length
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        size = self.size + len(item)
+        if self.items:
+            size += 2
+        if self.items and (size >= self.max_length or len(self.items) >= self.config.batch):
+            return False
+        self.items.append(item)
+        self.size = size
+        return True
+
+    @property
+    def serialized(self):
+        return '[' + ', '.join(self.items) + ']'
+
+    def render(self):
+        return [json.loads(item) for item in self.items]
+
+
+class Batcher(object):
+    def __init__(self):
+        self._batches = {}
+
+    def add(self, event, sink):
+        config = event.config
+        ready = []
+        batch = self._batches.get(config.source)
+        if batch and batch.config is not config:
+            ready.append(self._batches.pop(config.source))
+            batch = None
+        try:
+            item = event.serialized
+            if item is None:
+                item = json.dumps(event.render())
+            if len(item) + 2 >= sink.max_length:
+                item = sink.shrink(event.render(), sink.max_length - 2)
+        except Exception as err:
+            sink.drop(event, err)
+            return ready
+        if batch and not batch.add(item):
+            ready.append(self._batches.pop(config.source))
+            batch = None
+        if not batch:
+            batch = EventBatch(config, sink.max_length)
+            batch.add(item)
+            self._batches[config.source] = batch
+        if len(batch) >= config.batch:
+            ready.append(self._batches.pop(config.source))
+        return ready
+
+    def expired(self, now=None):
+        if now is None:
+            now = time.time()
+        ready = [
+            source for source, batch in self._batches.items()
+            if now - batch.created >= batch.config.batch_linger
+        ]
+        return [self._batches.pop(source) for source in ready]
+
+    def drain(self):
+        ready = list(self._batches.values())
+        self._batches = {}
+        return ready
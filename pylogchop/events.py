@@ -0,0 +1,209 @@
+__author__ = 'schlitzer'
+# stdlib
+import copy
+import json
+import logging
+import sys
+
+
+log = logging.getLogger('pylogchop')
+
+
+class SourceConfig(object):
+    __slots__ = (
+        'source', 'tag', 'facility', 'severity', 'sink',
+        'tags', 'tags_dict', 'template', 'timestamp',
+        'batch', 'batch_linger', '_render'
+    )
+
+    def __init__(
+            self, source, tag, facility, severity, sink,
+            tags, tags_dict, template, timestamp,
+            batch=0, batch_linger=0.2
+    ):
+        self.source = source
+        self.tag = tag
+        self.facility = facility
+        self.severity = severity
+        self.sink = sink
+        self.tags = tags
+        self.tags_dict = tags_dict
+        self.template = template
+        self.timestamp = timestamp
+        self.batch = batch
+        self.batch_linger = batch_linger
+        self._render = self._compile(template)
+
+    def _compile(self, template):
+        if isinstance(template, dict):
+            items = [(key, self._compile(value)) for key, value in template.items()]
+            return lambda event: {key: render(event) for key, render in items}
+        if isinstance(template, str) and template.startswith('$'):
+            render = self._compile_placeholder(template)
+            if render:
+                return render
+        if isinstance(template, (dict, list)):
+            return lambda event: copy.deepcopy(template)
+        return lambda event: template
+
+    def _compile_placeholder(self, value):
+        if value == "$FIRST_LINE":
+            return lambda event: event.first_line
+        elif value == "$OTHER_LINES":
+            return lambda event: event.other_lines or []
+        elif value == "$TAGS":
+            return lambda event: list(self.tags)
+        elif value == "$TAGS_DICT":
+            return lambda event: dict(self.tags_dict)
+        elif value == "$FIELDS":
+            return lambda event: event.fields if event.fields is not None else event.first_line
+        elif value.startswith('$F_'):
+            field = value[3:].rsplit('_', 1)
+            if not len(field) == 2:
+                return
+            field, field_type = field
+            convert = self._converter(field_type)
+            if not convert:
+                return
+
+            def render(event):
+                if not event.fields:
+                    return None
+                field_value = event.fields.get(field)
+                if field_value is None:
+                    return None
+                return convert(event, field_value, value)
+            return render
+        elif value.startswith('$RE_'):
+            group = value.split('_')
+            if not len(group) == 3:
+                return
+            try:
+                grp_num = int(group[1])
+            except ValueError:
+                return
+            convert = self._converter(group[2])
+            if not convert:
+                return
+
+            def render(event):
+                if event.match is None:
+                    return None
+                try:
+                    grp_value = event.match.group(grp_num)
+                except IndexError:
+                    log.error("no match group {0}".format(grp_num))
+                    return value
+                return convert(event, grp_value, value)
+            return render
+
+    def _converter(self, conv_type):
+        if conv_type == u'INT':
+            return self._to_int
+        elif conv_type == u'FLOAT':
+            return self._to_float
+        elif conv_type == u'STR':
+            return self._to_str
+        elif conv_type == u'RAW':
+            return self._to_raw
+        elif conv_type == u'TS':
+            return self._to_ts
+        elif conv_type == u'TSISO':
+            return self._to_tsiso
+
+    @staticmethod
+    def _to_int(event, value, placeholder):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            log.error("cannot transform {0} to integer".format(value))
+            return placeholder
+
+    @staticmethod
+    def _to_float(event, value, placeholder):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            log.error("cannot transform {0} to float".format(value))
+            return placeholder
+
+    @staticmethod
+    def _to_str(event, value, placeholder):
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value)
+
+    @staticmethod
+    def _to_raw(event, value, placeholder):
+        return value
+
+    def _epoch(self, event, value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            epoch = float(value)
+        else:
+            epoch = self.timestamp.parse(value)
+        if epoch is None:
+            log.error("cannot transform {0} to timestamp".format(value))
+            return
+        if event.event_time is None:
+            event.event_time = epoch
+        return epoch
+
+    def _to_ts(self, event, value, placeholder):
+        epoch = self._epoch(event, value)
+        if epoch is None:
+            return placeholder
+        return epoch
+
+    def _to_tsiso(self, event, value, placeholder):
+        epoch = self._epoch(event, value)
+        if epoch is None:
+            return placeholder
+        return self.timestamp.isoformat(epoch)
+
+    def render(self, event):
+        return self._render(event)
+
+
+class Event(object):
+    __slots__ = (
+        'config', 'first_line', 'other_lines', 'match', 'fields',
+        'queued', 'event_time', 'serialized'
+    )
+
+    def __init__(self, config, first_line, match=None, fields=None):
+        self.config = config
+        self.first_line = first_line
+        self.other_lines = None
+        self.match = match
+        self.fields = fields
+        self.queued = None
+        self.event_time = None
+        self.serialized = None
+
+    def add_line(self, line):
+        if self.other_lines is None:
+            self.other_lines = [line]
+        else:
+            self.other_lines.append(line)
+
+    def render(self):
+        if self.serialized is not None:
+            return json.loads(self.serialized)
+        return self.config.render(self)
+
+    def size(self):
+        size = sys.getsizeof(self) + sys.getsizeof(self.first_line)
+        if self.other_lines is not None:
+            size += sys.getsizeof(self.other_lines)
+            size += sum(sys.getsizeof(line) for line in self.other_lines)
+        if self.match is not None:
+            size += sys.getsizeof(self.match)
+        if self.fields is not None:
+            size += sys.getsizeof(self.fields)
+            size += sum(sys.getsizeof(value) for value in self.fields.values())
+        if self.serialized is not None:
+            size += sys.getsizeof(self.serialized)
+        if self.queued is not None:
+            size += sys.getsizeof(self.queued)
+        return size
@@ -0,0 +1,84 @@
+__author__ = 'schlitzer'
+# stdlib
+import re
+
+
+class RuleSet(object):
+    def __init__(self, rules=''):
+        self.rules = []
+        self.hits = []
+        self._prefixes = ()
+        self._prefix_rules = []
+        self._literals = []
+        self._regexes = []
+        prefixes = []
+        for rule in rules.splitlines():
+            rule = rule.strip()
+            if not rule:
+                continue
+            kind, sep, value = rule.partition(':')
+            if not sep or kind not in ('prefix', 'contains', 'regex'):
+                kind, value = 'contains', rule
+            num = len(self.rules)
+            self.rules.append((kind, value))
+            self.hits.append(0)
+            if kind == 'prefix':
+                prefixes.append(value)
+                self._prefix_rules.append(num)
+            elif kind == 'contains':
+                self._literals.append((num, value))
+            else:
+                self._regexes.append((num, re.compile(value)))
+        self._prefixes = tuple(prefixes)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def match(self, line):
+        if self._prefixes and line.startswith(self._prefixes):
+            for num, prefix in zip(self._prefix_rules, self._prefixes):
+                if line.startswith(prefix):
+                    self.hits[num] += 1
+                    return True
+        for num, literal in self._literals:
+            if literal in line:
+                self.hits[num] += 1
+                return True
+        for num, regex in self._regexes:
+            if regex.search(line):
+                self.hits[num] += 1
+                return True
+        return False
+
+    def stats(self):
+        return [
+            (kind, value, hits)
+            for (kind, value), hits in zip(self.rules, self.hits)
+        ]
+
+
+class LineFilter(object):
+    def __init__(self, include='', exclude=''):
+        self.include_rules = include
+        self.exclude_rules = exclude
+        self.include = RuleSet(include)
+        self.exclude = RuleSet(exclude)
+        self.dropped = 0
+
+    def __bool__(self):
+        return bool(self.include) or bool(self.exclude)
+
+    def keep(self, line):
+        if self.include and not self.include.match(line):
+            return False
+        if self.exclude and self.exclude.match(line):
+            return False
+        return True
+
+    def stats(self):
+        result = []
+        for kind, value, hits in self.include.stats():
+            result.append(('include', kind, value, hits))
+        for kind, value, hits in self.exclude.stats():
+            result.append(('exclude', kind, value, hits))
+        return result
@@ -0,0 +1,249 @@
+__author__ = 'schlitzer'
+# stdlib
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+CONFIG = """[main]
+dlog_file = {tmp}/pylogchop.dlog
+stats_interval = 0
+
+[file:logging]
+file = {tmp}/pylogchop.log
+retention = 1
+level = {level}
+
+[harness:sink]
+type = syslog
+address = {tmp}/log.sock
+
+[{tmp}/app.log:source]
+syslog_facility = LOG_DAEMON
+syslog_tag = harness
+syslog_severity = LOG_INFO
+tags = harness:true
+regex = ^(\\d+) (\\d+\\.\\d+)
+template = {tmp}/template.json
+sink = harness
+"""
+
+TEMPLATE = {
+    "seq": "$RE_1_INT",
+    "written": "$RE_2_FLOAT"
+}
+
+
+class Receiver(threading.Thread):
+    def __init__(self, address):
+        super().__init__(name='Receiver', daemon=True)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(address)
+        self._socket.settimeout(0.2)
+        self.lock = threading.Lock()
+        self.received = {}
+        self.latencies = []
+        self.last = time.time()
+        self.terminate = False
+
+    def run(self):
+        while not self.terminate:
+            try:
+                data = self._socket.recv(65536)
+            except socket.timeout:
+                continue
+            now = time.time()
+            try:
+                payload = json.loads(data.decode('utf-8').split(' harness: ', 1)[1])
+                seq = payload['seq']
+                written = payload['written']
+            except (IndexError, KeyError, ValueError):
+                continue
+            with self.lock:
+                self.received[seq] = self.received.get(seq, 0) + 1
+                if seq > 0 and self.received[seq] == 1:
+                    self.latencies.append(now - written)
+                self.last = now
+        self._socket.close()
+
+
+class Writer(object):
+    def __init__(self, file, mode):
+        self._file = file
+        self._fd = None
+        self.mode = mode
+        self.open()
+
+    def open(self):
+        self._fd = open(self._file, 'a', buffering=1)
+
+    def write(self, seq):
+        self._fd.write("{0} {1:.6f} harness line\n".format(seq, time.time()))
+
+    def rotate(self):
+        if self.mode == 'rename':
+            self._fd.close()
+            os.replace(self._file, self._file + '.1')
+            self.open()
+        elif self.mode == 'copytruncate':
+            shutil.copyfile(self._file, self._file + '.1')
+            self._fd.truncate(0)
+        elif self.mode == 'delete':
+            self._fd.close()
+            os.remove(self._file)
+            self.open()
+
+    def close(self):
+        self._fd.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def run(args):
+    tmp = tempfile.mkdtemp(prefix='pylogchop-harness-')
+    with open(os.path.join(tmp, 'pylogchop.ini'), 'w') as f:
+        f.write(CONFIG.format(tmp=tmp, level=args.level))
+    with open(os.path.join(tmp, 'template.json'), 'w') as f:
+        json.dump(TEMPLATE, f)
+    receiver = Receiver(os.path.join(tmp, 'log.sock'))
+    receiver.start()
+    writer = Writer(os.path.join(tmp, 'app.log'), args.mode)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    daemon = subprocess.Popen(
+        [
+            sys.executable, '-c', 'from pylogchop import main; main()',
+            '--cfg', os.path.join(tmp, 'pylogchop.ini'),
+            '--pid', os.path.join(tmp, 'pylogchop.pid'),
+            '--nodaemon', 'start'
+        ],
+        env=env
+    )
+    try:
+        started = time.time()
+        while not receiver.received:
+            if daemon.poll() is not None:
+                raise RuntimeError("pylogchop exited during startup")
+            if time.time() - started > args.startup_timeout:
+                raise RuntimeError("pylogchop did not deliver a warmup line")
+            writer.write(0)
+            time.sleep(0.2)
+
+        seq = 0
+        interval = 1.0 / args.rate
+        started = time.time()
+        next_rotate = started + args.rotate_interval
+        while time.time() - started < args.duration:
+            seq += 1
+            writer.write(seq)
+            if args.mode != 'none' and time.time() >= next_rotate:
+                writer.rotate()
+                next_rotate += args.rotate_interval
+            delay = started + seq * interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        while time.time() - receiver.last < args.settle:
+            time.sleep(0.2)
+    finally:
+        writer.close()
+        if daemon.poll() is None:
+            daemon.send_signal(signal.SIGTERM)
+            try:
+                daemon.wait(args.startup_timeout)
+            except subprocess.TimeoutExpired:
+                daemon.kill()
+        receiver.terminate = True
+        receiver.join()
+        if not args.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    with receiver.lock:
+        received = {key: value for key, value in receiver.received.items() if key > 0}
+        latencies = list(receiver.latencies)
+    return {
+        "mode": args.mode,
+        "rate": args.rate,
+        "duration": args.duration,
+        "sent": seq,
+        "received": len(received),
+        "lost": len([num for num in range(1, seq + 1) if num not in received]),
+        "duplicates": sum(count - 1 for count in received.values()),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies) if latencies else 0.0,
+        "tmp": tmp if args.keep else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure PyLogChop latency and loss while log files rotate"
+    )
+    parser.add_argument("--rate", dest="rate", type=float, default=100,
+                        help="Lines written per second")
+    parser.add_argument("--duration", dest="duration", type=float, default=10,
+                        help="Seconds to write lines for")
+    parser.add_argument("--mode", dest="mode", default='rename',
+                        choices=['none', 'rename', 'copytruncate', 'delete'],
+                        help="How to rotate the log file")
+    parser.add_argument("--rotate-interval", dest="rotate_interval", type=float, default=3,
+                        help="Seconds between rotations")
+    parser.add_argument("--settle", dest="settle", type=float, default=5,
+                        help="Seconds without deliveries before the run is considered complete")
+    parser.add_argument("--startup-timeout", dest="startup_timeout", type=float, default=30,
+                        help="Seconds to wait for PyLogChop to start and stop")
+    parser.add_argument("--level", dest="level", default='INFO',
+                        choices=['CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG'],
+                        help="Log level of the PyLogChop under test")
+    parser.add_argument("--keep", dest="keep", action="store_true",
+                        help="Keep the temporary directory for inspection")
+    parser.add_argument("--json", dest="json", action="store_true",
+                        help="Print the report as JSON")
+    parser.add_argument("--max-lost", dest="max_lost", type=int, default=None,
+                        help="Fail if more events than this are lost")
+    parser.add_argument("--max-duplicates", dest="max_duplicates", type=int, default=None,
+                        help="Fail if more events than this are duplicated")
+    parser.add_argument("--max-p99", dest="max_p99", type=float, default=None,
+                        help="Fail if the p99 latency in seconds is higher than this")
+    args = parser.parse_args()
+
+    report = run(args)
+    failed = []
+    if args.max_lost is not None and report['lost'] > args.max_lost:
+        failed.append("lost {0} > {1}".format(report['lost'], args.max_lost))
+    if args.max_duplicates is not None and report['duplicates'] > args.max_duplicates:
+        failed.append("duplicates {0} > {1}".format(report['duplicates'], args.max_duplicates))
+    if args.max_p99 is not None and report['latency_p99'] > args.max_p99:
+        failed.append("p99 {0:.3f}s > {1:.3f}s".format(report['latency_p99'], args.max_p99))
+    report['failed'] = failed
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("mode={mode} rate={rate}/s duration={duration}s".format(**report))
+        print("sent={sent} received={received} lost={lost} duplicates={duplicates}".format(**report))
+        print("latency p50={latency_p50:.3f}s p99={latency_p99:.3f}s max={latency_max:.3f}s".format(**report))
+        if report['tmp']:
+            print("kept {0}".format(report['tmp']))
+        for reason in failed:
+            print("FAILED: {0}".format(reason))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+__author__ = 'schlitzer'
+# stdlib
+import csv
+import json
+import re
+
+
+LOGFMT_PAIR = re.compile(r'([^\s=]+)(?:=(?:"((?:[^"\\]|\\.)*)"|(\S*)))?')
+
+
+def parse_json(line):
+    try:
+        fields = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(fields, dict):
+        return None
+    return fields
+
+
+def parse_logfmt(line):
+    fields = {}
+    for match in LOGFMT_PAIR.finditer(line):
+        key, quoted, value = match.groups()
+        if quoted is not None:
+            value = quoted
+            if '\\' in value:
+                try:
+                    value = json.loads('"' + value + '"')
+                except ValueError:
+                    pass
+        elif value is None:
+            value = True
+        fields[key] = value
+    return fields
+
+
+class CsvParser(object):
+    def __init__(self, fields='', delimiter=','):
+        if delimiter == '\\t':
+            delimiter = '\t'
+        self.delimiter = delimiter
+        self.fields = [field.strip() for field in fields.split(',') if field.strip()]
+
+    def __call__(self, line):
+        if '"' in line:
+            try:
+                row = next(csv.reader((line,), delimiter=self.delimiter))
+            except (csv.Error, StopIteration):
+                return None
+        else:
+            row = line.split(self.delimiter)
+        if self.fields:
+            return dict(zip(self.fields, row))
+        return {str(num): value for num, value in enumerate(row, 1)}
+
+
+def create_parser(parser='regex', csv_fields='', csv_delimiter=','):
+    if parser == 'regex':
+        return None
+    elif parser == 'json':
+        return parse_json
+    elif parser == 'logfmt':
+        return parse_logfmt
+    elif parser == 'csv':
+        return CsvParser(csv_fields, csv_delimiter)
+    raise ValueError("unknown parser {0}".format(parser))
@@ -0,0 +1,100 @@
+__author__ = 'schlitzer'
+# stdlib
+import logging
+import math
+import os
+import threading
+
+
+class PollHandle(object):
+    def __init__(self, poller, file, interval):
+        self._poller = poller
+        self.file = file
+        self.interval = interval
+        self.cancelled = False
+        self.rounds = 0
+        self.stat = None
+        self.wake = threading.Event()
+
+    def wait(self, active, max_interval=None):
+        if active:
+            self.interval = self._poller.min_interval
+        else:
+            max_interval = max_interval or self._poller.max_interval
+            self.interval = min(self.interval * 2, max_interval)
+        self.wake.clear()
+        if self.cancelled:
+            return
+        self._poller.schedule(self)
+        self.wake.wait()
+        return self.stat
+
+    def cancel(self):
+        self.cancelled = True
+        self.wake.set()
+        self._poller.unschedule(self)
+
+
+class Poller(threading.Thread):
+    def __init__(self, tick=0.05, slots=64, min_interval=0.25, max_interval=1.0, retry_interval=10.0):
+        super().__init__(name='Poller', daemon=True)
+        self.log = logging.getLogger('pylogchop')
+        self._lock = threading.Lock()
+        self._slot = 0
+        self._slots = [set() for _ in range(slots)]
+        self._shutdown = threading.Event()
+        self.tick = tick
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_interval = retry_interval
+
+    def register(self, file):
+        return PollHandle(self, file, self.min_interval)
+
+    def schedule(self, handle):
+        ticks = max(1, int(math.ceil(handle.interval / self.tick)))
+        with self._lock:
+            handle.rounds = (ticks - 1) // len(self._slots)
+            self._slots[(self._slot + ticks) % len(self._slots)].add(handle)
+
+    def unschedule(self, handle):
+        with self._lock:
+            for slot in self._slots:
+                slot.discard(handle)
+
+    def _advance(self):
+        with self._lock:
+            self._slot = (self._slot + 1) % len(self._slots)
+            slot = self._slots[self._slot]
+            due = [handle for handle in slot if handle.rounds == 0]
+            for handle in slot:
+                handle.rounds -= 1
+            slot.difference_update(due)
+        return due
+
+    def run(self):
+        self.log.info("poller up")
+        while not self._shutdown.wait(self.tick):
+            due = self._advance()
+            if not due:
+                continue
+            stats = {}
+            for handle in due:
+                if handle.file not in stats:
+                    try:
+                        stats[handle.file] = os.stat(handle.file)
+                    except OSError as err:
+                        stats[handle.file] = err
+                handle.stat = stats[handle.file]
+            for handle in due:
+                handle.wake.set()
+        self.log.info("poller gone")
+
+    def stop(self):
+        self._shutdown.set()
+        with self._lock:
+            handles = [handle for slot in self._slots for handle in slot]
+            for slot in self._slots:
+                slot.clear()
+        for handle in handles:
+            handle.wake.set()
@@ -0,0 +1,179 @@
+__author__ = 'schlitzer'
+# stdlib
+from collections import deque
+import time
+
+
+class SourceQueue(object):
+    def __init__(self, source, weight=1, priority=0):
+        self.source = source
+        self.messages = deque()
+        self.weight = weight
+        self.priority = priority
+        self.deficit = 0
+        self.retired = False
+        self.dequeued = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.lagged = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+
+    def reset_stats(self):
+        self.dequeued = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.lagged = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+
+    def event_size(self, sample=32):
+        sizes = []
+        for index in range(sample):
+            try:
+                sizes.append(self.messages[index].size())
+            except IndexError:
+                break
+        if not sizes:
+            return 0
+        return sum(sizes) // len(sizes)
+
+    def stats(self):
+        event_size = self.event_size()
+        return {
+            "depth": len(self.messages),
+            "event_size": event_size,
+            "queue_size": event_size * len(self.messages),
+            "dequeued": self.dequeued,
+            "wait_avg": self.wait_sum / self.dequeued if self.dequeued else 0.0,
+            "wait_max": self.wait_max,
+            "lag_avg": self.lag_sum / self.lagged if self.lagged else 0.0,
+            "lag_max": self.lag_max
+        }
+
+
+class _Round(object):
+    def __init__(self, queues):
+        self.queues = queues
+        self.cursor = 0
+        self.resume = False
+
+    def pop(self, result, limit, quantum, now):
+        queues = self.queues
+        idle = 0
+        while len(result) < limit and idle < len(queues):
+            if self.cursor >= len(queues):
+                self.cursor = 0
+            queue = queues[self.cursor]
+            messages = queue.messages
+            if not messages:
+                queue.deficit = 0
+                self.resume = False
+                self.cursor += 1
+                idle += 1
+                continue
+            idle = 0
+            if not self.resume:
+                queue.deficit += queue.weight * quantum
+            self.resume = False
+            while queue.deficit >= 1 and messages:
+                if len(result) >= limit:
+                    self.resume = True
+                    return
+                msg = messages.popleft()
+                queue.deficit -= 1
+                wait = now - msg.queued
+                queue.dequeued += 1
+                queue.wait_sum += wait
+                if wait > queue.wait_max:
+                    queue.wait_max = wait
+                result.append(msg)
+            if not messages:
+                queue.deficit = 0
+            self.cursor += 1
+
+
+class FairScheduler(object):
+    def __init__(self, quantum=10):
+        self._queues = {}
+        self._rounds = []
+        self.quantum = quantum
+
+    def __len__(self):
+        return sum(len(queue.messages) for queue in self._queues.values())
+
+    def _rebuild(self):
+        tiers = {}
+        for queue in self._queues.values():
+            tiers.setdefault(queue.priority, []).append(queue)
+        self._rounds = [
+            _Round(sorted(tiers[priority], key=lambda queue: queue.source))
+            for priority in sorted(tiers, reverse=True)
+        ]
+
+    def register(self, source, weight=1, priority=0):
+        queue = self._queues.get(source)
+        if queue:
+            queue.retired = False
+            queue.weight = weight
+            if queue.priority != priority:
+                queue.priority = priority
+                self._rebuild()
+            return queue.messages
+        queue = SourceQueue(source, weight, priority)
+        queues = dict(self._queues)
+        queues[source] = queue
+        self._queues = queues
+        self._rebuild()
+        return queue.messages
+
+    def unregister(self, source):
+        queue = self._queues.get(source)
+        if queue:
+            queue.retired = True
+
+    def _cleanup(self):
+        gone = [
+            source for source, queue in self._queues.items()
+            if queue.retired and not queue.messages
+        ]
+        if not gone:
+            return
+        queues = dict(self._queues)
+        for source in gone:
+            queues.pop(source)
+        self._queues = queues
+        self._rebuild()
+
+    def record_lag(self, events, now=None):
+        if now is None:
+            now = time.time()
+        for event in events:
+            if event.event_time is None:
+                continue
+            queue = self._queues.get(event.config.source)
+            if not queue:
+                continue
+            lag = now - event.event_time
+            queue.lagged += 1
+            queue.lag_sum += lag
+            if lag > queue.lag_max:
+                queue.lag_max = lag
+
+    def popmany(self, limit):
+        self._cleanup()
+        result = []
+        now = time.time()
+        for _round in self._rounds:
+            _round.pop(result, limit, self.quantum, now)
+            if len(result) >= limit:
+                break
+        return result
+
+    def stats(self, reset=False):
+        result = {}
+        for source, queue in self._queues.items():
+            result[source] = queue.stats()
+            if reset:
+                queue.reset_stats()
+        return result
@@ -16,6 +16,22 @@ CHECK_CONFIG_MAIN = {
         },
         "max_length": {
             "type": "integer",
+        },
+        "stats_interval": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "poll_interval_min": {
+            "type": "number",
+            "exclusiveMinimum": 0
+        },
+        "poll_interval_max": {
+            "type": "number",
+            "exclusiveMinimum": 0
+        },
+        "poll_retry_interval": {
+            "type": "number",
+            "exclusiveMinimum": 0
         }
     }
 }
@@ -105,16 +121,41 @@ CHECK_CONFIG_SOURCE = {
         "syslog_tag",
         "syslog_severity",
         "tags",
-        "template",
-        "regex"
+        "template"
     ],
     "optional": [
-        "encoding"
+        "encoding",
+        "regex",
+        "parser",
+        "csv_fields",
+        "csv_delimiter",
+        "timestamp_format",
+        "include",
+        "exclude",
+        "batch",
+        "batch_linger",
+        "max_line_length",
+        "regex_timeout",
+        "slow_match",
+        "max_slow_matches",
+        "sink",
+        "weight",
+        "priority"
     ],
     "properties": {
         "encoding": {
             "type": "string",
         },
+        "sink": {
+            "type": "string",
+        },
+        "weight": {
+            "type": "number",
+            "exclusiveMinimum": 0
+        },
+        "priority": {
+            "type": "integer",
+        },
         "syslog_facility": {
             "type": "string",
             "enum": [
@@ -163,5 +204,114 @@ CHECK_CONFIG_SOURCE = {
         "regex": {
             "type": "string",
         },
+        "parser": {
+            "type": "string",
+            "enum": [
+                "regex",
+                "json",
+                "logfmt",
+                "csv"
+            ]
+        },
+        "csv_fields": {
+            "type": "string",
+        },
+        "csv_delimiter": {
+            "type": "string",
+            "minLength": 1
+        },
+        "timestamp_format": {
+            "type": "string",
+            "minLength": 1
+        },
+        "include": {
+            "type": ["string", "number", "boolean"],
+        },
+        "exclude": {
+            "type": ["string", "number", "boolean"],
+        },
+        "batch": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "batch_linger": {
+            "type": "number",
+            "minimum": 0
+        },
+        "max_line_length": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "regex_timeout": {
+            "type": "number",
+            "minimum": 0
+        },
+        "slow_match": {
+            "type": "number",
+            "minimum": 0
+        },
+        "max_slow_matches": {
+            "type": "integer",
+            "minimum": 0
+        },
+    }
+}
+
+CHECK_CONFIG_SINK = {}
+CHECK_CONFIG_SINK['syslog'] = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": [
+        "type"
+    ],
+    "properties": {
+        "type": {
+            "type": "string",
+            "enum": [
+                "syslog"
+            ]
+        },
+        "address": {
+            "type": "string",
+        },
+    }
+}
+CHECK_CONFIG_SINK['ndjson'] = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": [
+        "type",
+        "file"
+    ],
+    "properties": {
+        "type": {
+            "type": "string",
+            "enum": [
+                "ndjson"
+            ]
+        },
+        "file": {
+            "type": "string",
+        },
+        "max_bytes": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "max_age": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "backups": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "buffer_size": {
+            "type": "integer",
+            "minimum": 0
+        },
+        "flush_interval": {
+            "type": "number",
+            "minimum": 0
+        },
     }
 }
@@ -0,0 +1,288 @@
+__author__ = 'schlitzer'
+# stdlib
+import json
+import logging
+import os
+import socket
+import sys
+import syslog
+import time
+
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def rfc3164_timestamp(now=None):
+    now = time.localtime(now)
+    return "{0} {1:>2} {2:02d}:{3:02d}:{4:02d}".format(
+        MONTHS[now.tm_mon - 1], now.tm_mday, now.tm_hour, now.tm_min, now.tm_sec
+    )
+
+
+class Sink(object):
+    def __init__(self, name, max_length=31000):
+        self.log = logging.getLogger('pylogchop')
+        self.name = name
+        self.max_length = max_length
+
+    @staticmethod
+    def _shrink_list(msg):
+        if not msg:
+            return
+        last_item = msg.pop()
+        if last_item == '...' and msg:
+            last_item = msg.pop()
+        if not isinstance(last_item, str) or len(last_item) > 3:
+            msg.append("...")
+
+    @staticmethod
+    def _shrink_dict(msg):
+        cut = 6
+        if not msg:
+            return msg
+        fieldlen = { field: len(json.dumps(msg[field])) for field in msg}
+        fieldlen_list = sorted(fieldlen.items(), key=lambda item: item[1])
+        field_key, field_len = fieldlen_list.pop()
+        if isinstance(msg[field_key], str):
+            msg[field_key] = msg[field_key][0:-cut] + "..."
+        elif isinstance(msg[field_key], dict):
+            msg[field_key] = Sink._shrink_dict(msg[field_key])
+        elif isinstance(msg[field_key], list):
+            Sink._shrink_list(msg[field_key])
+        else:
+            msg[field_key] = json.dumps(msg[field_key])[0:-cut] + "..."
+        return msg
+
+    def shrink(self, msg, max_length=None):
+        max_length = max_length or self.max_length
+        cut = 6
+        msgjson = json.dumps(msg) # ensure_ascii=False)
+        msgsize = len(msgjson)
+        while msgsize >= max_length:
+            if isinstance(msg, list):
+                self._shrink_list(msg)
+            elif isinstance(msg, dict):
+                self._shrink_dict(msg)
+            elif isinstance(msg, str):
+                msg = msg[0:min(len(msg)-cut, max_length-cut-3)] + "..."
+            else:
+                msg = msgjson
+                continue
+            shrunk = json.dumps(msg)
+            if shrunk == msgjson and not isinstance(msg, str):
+                msg = msgjson
+                continue
+            msgjson = shrunk
+            msgsize = len(msgjson)
+        return msgjson
+
+    def drop(self, event, err):
+        self.log.error("dropping message from {0}, could not render it: {1}".format(
+            event.config.source, err
+        ))
+
+    def payload(self, event):
+        serialized = getattr(event, 'serialized', None)
+        if serialized is not None and len(serialized) < self.max_length:
+            return serialized
+        try:
+            return self.shrink(event.render())
+        except Exception as err:
+            self.drop(event, err)
+
+    def send(self, events):
+        raise NotImplementedError
+
+    def tick(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class SyslogSink(Sink):
+    _ident = None
+
+    def __init__(self, name, max_length=31000, address=None):
+        super().__init__(name, max_length)
+        self._address = None
+        self._family = None
+        self._socket = None
+        if address:
+            address_split = address.rsplit(":", 1)
+            if len(address_split) == 2 and address_split[1].isdigit():
+                self._address = (address_split[0], int(address_split[1]))
+                self._family = socket.AF_INET
+            else:
+                self._address = address
+                self._family = socket.AF_UNIX
+
+    def _connect(self):
+        self._socket = socket.socket(self._family, socket.SOCK_DGRAM)
+        try:
+            self._socket.connect(self._address)
+        except OSError:
+            self._socket.close()
+            self._socket = None
+            raise
+
+    def _send_socket(self, events):
+        for event in events:
+            payload = self.payload(event)
+            if payload is None:
+                continue
+            config = event.config
+            msg = "<{0}>{1} {2}: {3}".format(
+                getattr(syslog, config.facility) | getattr(syslog, config.severity),
+                rfc3164_timestamp(),
+                config.tag,
+                payload
+            )
+            try:
+                if not self._socket:
+                    self._connect()
+                self._socket.send(msg.encode('utf-8'))
+            except OSError as err:
+                self.log.error("could not send to syslog sink {0}: {1}".format(self.name, err))
+                if self._socket:
+                    self._socket.close()
+                    self._socket = None
+
+    def _openlog(self, tag, facility):
+        ident = (tag, facility)
+        if SyslogSink._ident != ident:
+            syslog.openlog(tag, 0, getattr(syslog, facility))
+            SyslogSink._ident = ident
+
+    def send(self, events):
+        if self._address:
+            self._send_socket(events)
+            return
+        for event in events:
+            payload = self.payload(event)
+            if payload is None:
+                continue
+            config = event.config
+            self._openlog(config.tag, config.facility)
+            syslog.syslog(getattr(syslog, config.severity), payload)
+
+    def close(self):
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+
+class NdjsonSink(Sink):
+    def __init__(
+            self, name, file, max_bytes=0, max_age=0, backups=5,
+            buffer_size=65536, flush_interval=1.0, max_length=31000
+    ):
+        super().__init__(name, max_length)
+        self._fd = None
+        self._file = file
+        self._opened = None
+        self._size = 0
+        self._buffer = []
+        self._buffered = 0
+        self._flushed = time.time()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+
+    def _open(self):
+        self.log.debug("opening ndjson sink {0}: {1}".format(self.name, self._file))
+        if self._file == '-':
+            self._fd = sys.stdout
+            self._size = 0
+        else:
+            self._fd = open(self._file, 'a', encoding='utf-8')
+            self._size = self._fd.tell()
+        self._opened = time.time()
+
+    def _rotate(self):
+        self.log.info("rotating ndjson sink {0}: {1}".format(self.name, self._file))
+        self._fd.close()
+        self._fd = None
+        for num in range(self.backups - 1, 0, -1):
+            src = "{0}.{1}".format(self._file, num)
+            if os.path.exists(src):
+                os.replace(src, "{0}.{1}".format(self._file, num + 1))
+        if self.backups > 0:
+            os.replace(self._file, "{0}.1".format(self._file))
+        else:
+            os.remove(self._file)
+        self._open()
+
+    def _need_rotate(self, pending):
+        if self._file == '-' or self._size == 0:
+            return False
+        if self.max_bytes and self._size + pending > self.max_bytes:
+            return True
+        if self.max_age and time.time() - self._opened >= self.max_age:
+            return True
+        return False
+
+    def send(self, events):
+        for event in events:
+            serialized = getattr(event, 'serialized', None)
+            if serialized is None:
+                try:
+                    serialized = json.dumps(event.render())
+                except Exception as err:
+                    self.drop(event, err)
+                    continue
+            line = serialized + '\n'
+            self._buffer.append(line)
+            self._buffered += len(line)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def tick(self):
+        if self._buffer and time.time() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._flushed = time.time()
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        try:
+            if not self._fd:
+                self._open()
+            if self._need_rotate(len(data)):
+                self._rotate()
+            self._fd.write(data)
+            self._fd.flush()
+            self._size += len(data)
+        except OSError as err:
+            self.log.error("could not write to ndjson sink {0}: {1}".format(self.name, err))
+            self._close()
+
+    def _close(self):
+        if self._fd and self._fd is not sys.stdout:
+            self._fd.close()
+        self._fd = None
+
+    def close(self):
+        self.flush()
+        self._close()
+
+
+SINKS = {
+    'syslog': SyslogSink,
+    'ndjson': NdjsonSink,
+}
+
+
+def create_sink(name, conf, max_length=31000):
+    conf = dict(conf)
+    sink_type = conf.pop('type')
+    conf['max_length'] = max_length
+    return SINKS[sink_type](name, **conf)
@@ -0,0 +1,174 @@
+__author__ = 'schlitzer'
+# stdlib
+import calendar
+import datetime
+import time
+
+
+MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
+
+
+def _offset(tz):
+    if tz in ('Z', 'z', 'UTC', 'GMT'):
+        return 0
+    if len(tz) not in (5, 6) or tz[0] not in '+-':
+        raise ValueError("invalid timezone {0}".format(tz))
+    offset = int(tz[1:3]) * 3600 + int(tz[-2:]) * 60
+    if tz[0] == '-':
+        return -offset
+    return offset
+
+
+def _epoch(year, month, day, hour, minute, second, tz=''):
+    # mktime and timegm silently normalise out of range fields, datetime does not
+    datetime.datetime(year, month, day, hour, minute, second)
+    if tz:
+        return float(calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0)) - _offset(tz))
+    return time.mktime((year, month, day, hour, minute, second, 0, 0, -1))
+
+
+class TimestampParser(object):
+    def __init__(self, fmt='iso8601', cache_size=4096):
+        self._cache = {}
+        self._cache_size = cache_size
+        self._iso_second = None
+        self._iso_string = None
+        self._fmt = None
+        self._fraction_sep = None
+        self._parse = None
+        self.fmt = fmt
+
+    @property
+    def fmt(self):
+        return self._fmt
+
+    @fmt.setter
+    def fmt(self, fmt):
+        self._fmt = fmt
+        self._fraction_sep = None
+        self._cache = {}
+        if fmt == 'iso8601':
+            self._parse = self._parse_iso8601
+        elif fmt == 'syslog':
+            self._parse = self._parse_syslog
+        elif fmt == 'clf':
+            self._parse = self._parse_clf
+        else:
+            self._parse = self._parse_strptime
+            if fmt.count('%f') == 1:
+                head, tail = fmt.split('%f')
+                # only key the cache on the whole second part if the fraction
+                # can be found again as the last digits after its separator
+                if head and head[-1] != '%' and head[-2:-1] != '%' and head[-1] not in tail:
+                    self._fraction_sep = head[-1]
+
+    def _remember(self, key, value):
+        if len(self._cache) >= self._cache_size:
+            self._cache = {}
+        self._cache[key] = value
+
+    def _parse_iso8601(self, value):
+        # 2016-01-02T03:04:05.123+01:00, the fraction is the only part that
+        # changes more than once a second, so it is kept out of the cache key
+        prefix = value[:19]
+        rest = value[19:]
+        fraction = 0.0
+        if rest[:1] in ('.', ','):
+            end = 1
+            while end < len(rest) and rest[end].isdigit():
+                end += 1
+            if end > 1:
+                fraction = float('0.' + rest[1:end])
+            rest = rest[end:]
+        key = prefix + rest
+        try:
+            return self._cache[key] + fraction
+        except KeyError:
+            pass
+        if len(prefix) != 19 or prefix[4] != '-' or prefix[7] != '-' or prefix[10] not in 'T t' \
+                or prefix[13] != ':' or prefix[16] != ':':
+            raise ValueError("not an iso8601 timestamp: {0}".format(value))
+        base = _epoch(
+            int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]),
+            int(prefix[11:13]), int(prefix[14:16]), int(prefix[17:19]),
+            rest.strip()
+        )
+        self._remember(key, base)
+        return base + fraction
+
+    def _parse_syslog(self, value):
+        # Jan  2 03:04:05, without a year, so take the one that is not in the future
+        key = value[:15]
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        if len(key) != 15 or key[9] != ':' or key[12] != ':':
+            raise ValueError("not a syslog timestamp: {0}".format(value))
+        month = MONTHS[key[0:3]]
+        day = int(key[4:6])
+        hour, minute, second = int(key[7:9]), int(key[10:12]), int(key[13:15])
+        year = time.localtime().tm_year
+        result = _epoch(year, month, day, hour, minute, second)
+        if result > time.time() + 86400:
+            result = _epoch(year - 1, month, day, hour, minute, second)
+        self._remember(key, result)
+        return result
+
+    def _parse_clf(self, value):
+        # 10/Oct/2000:13:55:36 -0700
+        try:
+            return self._cache[value]
+        except KeyError:
+            pass
+        if len(value) < 20 or value[2] != '/' or value[6] != '/' or value[11] != ':':
+            raise ValueError("not a clf timestamp: {0}".format(value))
+        result = _epoch(
+            int(value[7:11]), MONTHS[value[3:6]], int(value[0:2]),
+            int(value[12:14]), int(value[15:17]), int(value[18:20]),
+            value[20:].strip()
+        )
+        self._remember(value, result)
+        return result
+
+    def _parse_strptime(self, value):
+        key = value
+        fraction = 0.0
+        if self._fraction_sep:
+            start = value.rfind(self._fraction_sep) + 1
+            end = start
+            while end < len(value) and value[end].isdigit():
+                end += 1
+            if start and start < end <= start + 6:
+                fraction = float('0.' + value[start:end])
+                key = value[:start] + value[end:]
+        try:
+            return self._cache[key] + fraction
+        except KeyError:
+            pass
+        parsed = datetime.datetime.strptime(value, self._fmt)
+        if parsed.tzinfo:
+            base = parsed.replace(microsecond=0).timestamp()
+        else:
+            base = time.mktime(parsed.timetuple())
+        self._remember(key, base)
+        return base + parsed.microsecond / 1000000
+
+    def parse(self, value):
+        if not value:
+            return None
+        try:
+            return self._parse(value)
+        except (KeyError, OverflowError, ValueError):
+            return None
+
+    def isoformat(self, epoch):
+        second = int(epoch)
+        if second != self._iso_second:
+            self._iso_second = second
+            self._iso_string = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+        millis = min(int(round((epoch - second) * 1000)), 999)
+        return "{0}.{1:03d}Z".format(self._iso_string, millis)
@@ -1,7 +1,7 @@
 __author__ = 'schlitzer'
 # stdlib
+from collections import deque
 import codecs
-import copy
 import json
 import json.decoder
 import logging
@@ -10,38 +10,130 @@ import re
 import threading
 import time
 
+# 3rd party
+try:
+    import regex as regex_module
+except ImportError:
+    regex_module = None
+
+# project
+from pylogchop.events import Event, SourceConfig
+from pylogchop.parsers import parse_json
+from pylogchop.timestamps import TimestampParser
+
 
 class Worker(threading.Thread):
     def __init__(
             self, file, msgqueue, tags, regex, template,
             syslog_facility, syslog_tag, syslog_severity,
-            encoding
+            encoding, sink='syslog', parser=None, timestamp_format='iso8601',
+            source=None, line_filter=None, batch=0, batch_linger=0.2,
+            max_line_length=0, regex_timeout=0, slow_match=0.05, max_slow_matches=0,
+            poller=None
     ):
         super().__init__(name='Worker:'+file)
         self.log = logging.getLogger('pylogchop')
+        self._batch = 0
+        self._batch_linger = 0.2
+        self._config = None
+        self._dropping = False
+        self._event = None
         self._fd = None
         self._file = file
-        self._data = None
         self._encoding = None
+        self._line_offset = 0
         self._msgqueue = msgqueue
+        self._open_failed = False
+        self._offset = 0
+        self._partial = ''
+        self._poll = None
+        self._poller = poller
         self._st_ino = None
         self._st_dev = None
         self._st_size = None
         self._pos = None
         self._regex = None
+        self._regex_pattern = ''
+        self._regex_timeout = 0
+        self._seek_end = True
+        self._sink = None
+        self._source = source or file
+        self._starving = False
+        self._syslog_facility = None
+        self._syslog_severity = None
+        self._syslog_tag = None
         self._tags = None
         self._tags_dict = None
         self._template = None
+        self._terminate = False
+        self._timestamp = TimestampParser(timestamp_format)
         self.encoding = encoding
         self.template = template
+        self.max_line_length = max_line_length
+        self.slow_match = slow_match
+        self.max_slow_matches = max_slow_matches
+        self.slow_matches = deque(maxlen=10)
+        self.slow_match_count = 0
+        self.regex_timeout = regex_timeout
         self.regex = regex
+        self.parser = parser
+        self.line_filter = line_filter
         self.syslog_facility = syslog_facility
         self.syslog_tag = syslog_tag
         self.syslog_severity = syslog_severity
+        self.sink = sink
+        self.batch = batch
+        self.batch_linger = batch_linger
         self.tags = tags
         self.tags_dict = tags
         self.terminate = False
 
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = SourceConfig(
+                source=self._source,
+                tag=self.syslog_tag,
+                facility=self.syslog_facility,
+                severity=self.syslog_severity,
+                sink=self.sink,
+                tags=self.tags,
+                tags_dict=self.tags_dict,
+                template=self.template,
+                timestamp=self._timestamp,
+                batch=self.batch,
+                batch_linger=self.batch_linger
+            )
+        return self._config
+
+    @property
+    def batch(self):
+        return self._batch
+
+    @batch.setter
+    def batch(self, batch):
+        self._batch = batch
+        self._config = None
+
+    @property
+    def batch_linger(self):
+        return self._batch_linger
+
+    @batch_linger.setter
+    def batch_linger(self, batch_linger):
+        self._batch_linger = batch_linger
+        self._config = None
+
+    @property
+    def terminate(self):
+        return self._terminate
+
+    @terminate.setter
+    def terminate(self, terminate):
+        self._terminate = terminate
+        if terminate and self._poll:
+            self._poll.cancel()
+
     @property
     def encoding(self):
         return self._encoding
@@ -50,17 +142,41 @@ class Worker(threading.Thread):
     def encoding(self, encoding):
         self._encoding = encoding
 
+    @property
+    def msgqueue(self):
+        return self._msgqueue
+
     @property
     def regex(self):
         return self._regex
 
     @regex.setter
     def regex(self, regex):
+        self._regex_pattern = regex
+        self.slow_match_count = 0
         if regex == '':
             self._regex = None
+        elif self.regex_timeout and regex_module:
+            self._regex = regex_module.compile(regex)
         else:
             self._regex = re.compile(regex)
 
+    @property
+    def regex_pattern(self):
+        return self._regex_pattern
+
+    @property
+    def regex_timeout(self):
+        return self._regex_timeout
+
+    @regex_timeout.setter
+    def regex_timeout(self, regex_timeout):
+        if regex_timeout and not regex_module:
+            self.log.warning("regex_timeout needs the regex module, matching without timeout")
+        self._regex_timeout = regex_timeout
+        if self._regex_pattern:
+            self.regex = self._regex_pattern
+
     @property
     def template(self):
         return self._template
@@ -71,11 +187,22 @@ class Worker(threading.Thread):
             with open(template, 'r') as f:
                 try:
                     self._template = json.load(f)
+                    self._config = None
                 except json.decoder.JSONDecodeError as err:
                     self.log.fatal("could not parse template".format(err))
         except OSError as err:
             self.log.fatal("could not read template: {0}".format(err))
 
+    @property
+    def timestamp_format(self):
+        return self._timestamp.fmt
+
+    @timestamp_format.setter
+    def timestamp_format(self, timestamp_format):
+        if timestamp_format != self._timestamp.fmt:
+            self._timestamp = TimestampParser(timestamp_format)
+            self._config = None
+
     @property
     def tags(self):
         return self._tags
@@ -84,6 +211,7 @@ class Worker(threading.Thread):
     def tags(self, tags):
         self._tags = tags.split(',')
         self.tags_dict = tags
+        self._config = None
 
     @property
     def tags_dict(self):
@@ -101,96 +229,161 @@ class Worker(threading.Thread):
             key, value = tag
             tags_dict[key] = value
         self._tags_dict = tags_dict
+        self._config = None
+
+    @property
+    def sink(self):
+        return self._sink
 
-    def _build_message(self, msg):
-        for key, value in msg.items():
-            if isinstance(value, dict):
-                self._build_message(msg[key])
-            elif isinstance(value, str):
-                if value == "$FIRST_LINE":
-                    msg[key] = self._data['first_line']
-                elif value == "$OTHER_LINES":
-                    msg[key] = self._data['other_lines']
-                elif value == "$TAGS":
-                    msg[key] = self.tags
-                elif value == "$TAGS_DICT":
-                    msg[key] = self.tags_dict
-                elif value.startswith('$RE_'):
-                    value = value.split('_')
-                    if not len(value) == 3:
-                        continue
-                    try:
-                        grp_num = int(value[1])
-                    except ValueError:
-                        continue
-                    grp_type = value[2]
-                    if grp_type == u'INT':
-                        try:
-                            msg[key] = int(self._data['match'].group(grp_num))
-                        except IndexError:
-                            self.log.error("no match group {0}".format(grp_num))
-                        except ValueError:
-                            self.log.error("cannot transform {0} to integer".format(self._data['match'].group(grp_num)))
-                    elif grp_type == u'FLOAT':
-                        try:
-                            msg[key] = float(self._data['match'].group(grp_num))
-                        except IndexError:
-                            self.log.error("no match group {0}".format(grp_num))
-                        except ValueError:
-                            self.log.error("cannot transform {0} to float".format(self._data['match'].group(grp_num)))
-                    elif grp_type == u'STR':
-                        try:
-                            msg[key] = self._data['match'].group(grp_num)
-                        except IndexError:
-                            self.log.error("no match group {0}".format(grp_num))
+    @sink.setter
+    def sink(self, sink):
+        self._sink = sink
+        self._config = None
+
+    @property
+    def syslog_facility(self):
+        return self._syslog_facility
+
+    @syslog_facility.setter
+    def syslog_facility(self, syslog_facility):
+        self._syslog_facility = syslog_facility
+        self._config = None
+
+    @property
+    def syslog_severity(self):
+        return self._syslog_severity
+
+    @syslog_severity.setter
+    def syslog_severity(self, syslog_severity):
+        self._syslog_severity = syslog_severity
+        self._config = None
+
+    @property
+    def syslog_tag(self):
+        return self._syslog_tag
+
+    @syslog_tag.setter
+    def syslog_tag(self, syslog_tag):
+        self._syslog_tag = syslog_tag
+        self._config = None
 
     def build_message(self):
-        msg = {
-            "tag": self.syslog_tag,
-            "severity": self.syslog_severity,
-            "facility": self.syslog_facility
-        }
-        payload = copy.deepcopy(self.template)
-        self._build_message(payload)
-        msg["payload"] = payload
-        self._msgqueue.append(msg)
-        self._data = None
+        self._event.queued = time.time()
+        self._msgqueue.append(self._event)
+        self._event = None
+
+    def flush(self):
+        if self._event:
+            self.build_message()
+
+    def _filter_line(self, line):
+        if self.line_filter.keep(line):
+            return False
+        if not self.parser and self.regex:
+            if self._event:
+                if self._match(line):
+                    self.log.debug("submitting previous message, dropping filtered message")
+                    self.build_message()
+                    self._dropping = True
+                else:
+                    self.log.debug("got new line for multiline payload")
+                    self._event.add_line(line)
+                    self._starving = False
+                    return True
+            else:
+                self._dropping = True
+        self.line_filter.dropped += 1
+        return True
+
+    def _match(self, line):
+        regex = self._regex
+        if regex is None:
+            return None
+        endpos = self.max_line_length or len(line)
+        started = time.thread_time()
+        timeout = None
+        try:
+            if isinstance(regex, re.Pattern):
+                match = regex.match(line, 0, endpos)
+            else:
+                timeout = self.regex_timeout or None
+                match = regex.match(line, 0, endpos, timeout=timeout)
+        except TimeoutError:
+            self.log.warning("regex match timed out after {0}s".format(timeout))
+            match = None
+        elapsed = time.thread_time() - started
+        if self.slow_match and elapsed >= self.slow_match:
+            self._slow_match(line, elapsed)
+        return match
+
+    def _slow_match(self, line, elapsed):
+        self.slow_match_count += 1
+        self.slow_matches.append((self._line_offset, len(line), elapsed))
+        self.log.warning("slow regex match: {0:.3f}s at offset {1} for line of length {2}".format(
+            elapsed, self._line_offset, len(line)
+        ))
+        if self.max_slow_matches and self.slow_match_count >= self.max_slow_matches:
+            self.log.error("{0} slow regex matches, degrading to plain line mode".format(self.slow_match_count))
+            self._dropping = False
+            self._regex = None
 
     def process_line(self, line):
-        if self.regex:
-            match = self.regex.match(line)
-            if match and self._data:
+        self._line_offset = self._offset
+        self._offset += len(line.encode(self.encoding, 'ignore'))
+        if self.line_filter and self._filter_line(line):
+            return
+        if self.parser is parse_json and self.template == '$FIELDS':
+            self.process_raw_json(line)
+        elif self.parser:
+            fields = self.parser(line.rstrip('\r\n'))
+            if fields is None:
+                self.log.error("could not parse line, passing it on without fields")
+                self.log.error("{0}".format(line))
+            self.process_first_line(line, None, fields)
+            self.build_message()
+        elif self.regex:
+            match = self._match(line)
+            if match:
+                self._dropping = False
+            elif self._dropping:
+                self.log.debug("dropping line of filtered multiline message")
+                return
+            if match and self._event:
                 self.log.debug("submitting previous message")
                 self.build_message()
                 self.log.debug("detected new log message")
                 self.process_first_line(line, match)
-            elif match and not self._data:
+            elif match and not self._event:
                 self.log.debug("detected new log message")
                 self.process_first_line(line, match)
-            elif self._data and not match:
+            elif self._event and not match:
                 self.log.debug("got new line for multiline payload")
-                self._data['other_lines'].append(line)
-                self._data['starving'] = False
+                self._event.add_line(line)
+                self._starving = False
             else:
                 self.log.error("got line that is not matching regex, and not part of a multiline log message")
                 self.log.error("{0}".format(line))
                 pass
         else:
             self.log.debug("got new plan log message")
+            self.flush()
             self.process_first_line(line, None)
             self.build_message()
 
-    def process_first_line(self, line, match):
+    def process_raw_json(self, line):
+        raw = line.rstrip('\r\n')
+        self.process_first_line(line, None)
+        if raw.startswith('{') and raw.endswith('}'):
+            self._event.serialized = raw
+        else:
+            self.log.error("could not parse line, passing on the raw line")
+            self.log.error("{0}".format(line))
+        self.build_message()
+
+    def process_first_line(self, line, match, fields=None):
         self.log.debug("creating new message")
-        self._data = {
-            "starving": False,
-            "facility": self.syslog_facility,
-            "tag": self.syslog_tag,
-            "severity": self.syslog_severity,
-            "first_line":  line,
-            "other_lines": [],
-            "match": match
-        }
+        self._starving = False
+        self._event = Event(self.config, line, match, fields)
 
     def close(self):
         if self._fd:
@@ -199,43 +392,80 @@ class Worker(threading.Thread):
             self._fd = None
             self.log.debug("done closing log file")
 
+    def _readline(self):
+        self._pos = self._fd.tell()
+        line = self._fd.readline()
+        if not line:
+            self._fd.seek(self._pos, 0)
+            return line
+        if not line.endswith('\n'):
+            self._partial += line
+            return ''
+        if self._partial:
+            line = self._partial + line
+            self._partial = ''
+        return line
+
+    def _drain(self):
+        while True:
+            line = self._fd.readline()
+            if not line:
+                break
+            if not line.endswith('\n'):
+                self._partial += line
+                continue
+            if self._partial:
+                line = self._partial + line
+                self._partial = ''
+            yield line
+        if self._partial:
+            yield self._partial
+            self._partial = ''
+
     def follow(self):
+        active = True
+        stat = None
         while not self.terminate:
-            if self._fd:
-                self.chk_stat()
-            if not self._fd:
-                self.open()
-            if not self._fd:
+            if not self._fd and (isinstance(stat, OSError) or not self._open()):
+                stat = self._poll.wait(active=False, max_interval=self._poller.retry_interval)
                 continue
-            self._pos = self._fd.tell()
-            line = self._fd.readline()
+            line = self._readline()
             if line:
+                active = True
                 yield line
-            else:
-                self._fd.seek(self._pos, 0)
-                if self._data:
-                    if self._data['starving']:
-                        self.build_message()
-                    else:
-                        self._data['starving'] = True
-                time.sleep(1)
-
-    def chk_stat(self):
-        try:
-            stat = os.stat(self._file)
-        except OSError as err:
-            self.log.error("could not stat file: {0}".format(err))
-            self.close()
-            return
-        if self._pos > stat.st_size:
-            self.log.info("truncate detected, reopening")
-            self.close()
-        elif self._st_dev != stat.st_dev:
+                continue
+            if self._event:
+                if self._starving:
+                    self.flush()
+                else:
+                    self._starving = True
+            stat = self._poll.wait(active)
+            active = False
+            if self.terminate:
+                break
+            if self.chk_stat(stat):
+                self.log.debug("reading remaining lines before reopening")
+                for line in self._drain():
+                    yield line
+                self.close()
+
+    def chk_stat(self, stat):
+        if isinstance(stat, OSError):
+            self.log.error("could not stat file: {0}".format(stat))
+            return True
+        if stat is None:
+            return False
+        if self._st_dev != stat.st_dev:
             self.log.info("underling device changed, reopening")
-            self.close()
+            return True
         elif self._st_ino != stat.st_ino:
             self.log.info("inode has changed, reopening")
+            return True
+        elif self._pos > stat.st_size:
+            self.log.info("truncate detected, reopening")
+            self._partial = ''
             self.close()
+        return False
 
     def _open(self):
         if self._fd:
@@ -243,35 +473,38 @@ class Worker(threading.Thread):
         self.log.debug("open logfile")
         try:
             self._fd = codecs.open(self._file, mode='r', encoding=self.encoding, errors='ignore')
-            self._fd.seek(0, 2)
-            stat = os.stat(self._file)
+            if self._seek_end:
+                self._fd.seek(0, 2)
+            stat = os.fstat(self._fd.fileno())
             self._st_dev = stat.st_dev
             self._st_ino = stat.st_ino
             self._pos = self._fd.tell()
+            self._offset = self._pos
         except OSError as err:
-            self.log.error("could not open logfile: {0}".format(err))
+            if self._open_failed:
+                self.log.debug("could not open logfile: {0}".format(err))
+            else:
+                self.log.error("could not open logfile, retrying: {0}".format(err))
+                self._open_failed = True
+            self.close()
             return False
+        if self._open_failed:
+            self.log.info("logfile is available again")
+            self._open_failed = False
+        self._seek_end = False
         self.log.debug("done open logfile")
         return True
 
-    def open(self):
-        sleep = 0
-        while not self.terminate:
-            if sleep == 0:
-                if self._open():
-                    return
-                sleep = 10
-                self.log.error("retrying opening in 10 seconds")
-            else:
-                time.sleep(1)
-                sleep -= 1
-
     def run(self):
         self.log.info("i am up")
+        self._poll = self._poller.register(self._file)
+        if self.terminate:
+            self._poll.cancel()
         for line in self.follow():
+            self.process_line(line)
             if self.terminate:
                 break
-            self.process_line(line)
         self.log.info("i am going down")
+        self.flush()
         self.close()
         self.log.info("gone")
@@ -0,0 +1,118 @@
+__author__ = 'schlitzer'
+# stdlib
+import calendar
+import time
+import unittest
+
+# project
+from pylogchop.timestamps import TimestampParser
+
+
+class TestIso8601(unittest.TestCase):
+    def setUp(self):
+        self.parser = TimestampParser('iso8601')
+
+    def test_utc(self):
+        self.assertEqual(
+            self.parser.parse('2016-01-02T03:04:05Z'),
+            calendar.timegm((2016, 1, 2, 3, 4, 5, 0, 0, 0))
+        )
+
+    def test_offset(self):
+        self.assertEqual(
+            self.parser.parse('2016-01-02T03:04:05+01:00'),
+            calendar.timegm((2016, 1, 2, 2, 4, 5, 0, 0, 0))
+        )
+
+    def test_fraction(self):
+        base = calendar.timegm((2016, 1, 2, 3, 4, 5, 0, 0, 0))
+        self.assertAlmostEqual(self.parser.parse('2016-01-02T03:04:05.250Z'), base + 0.25)
+        self.assertAlmostEqual(self.parser.parse('2016-01-02T03:04:05.750Z'), base + 0.75)
+
+    def test_local(self):
+        self.assertEqual(
+            self.parser.parse('2016-01-02T03:04:05'),
+            time.mktime((2016, 1, 2, 3, 4, 5, 0, 0, -1))
+        )
+
+    def test_invalid(self):
+        self.assertIsNone(self.parser.parse('2016-13-45T03:04:05'))
+        self.assertIsNone(self.parser.parse('2016-02-30T25:04:05Z'))
+        self.assertIsNone(self.parser.parse('2016-13-02T03:04:05Z'))
+        self.assertIsNone(self.parser.parse('not a timestamp'))
+        self.assertIsNone(self.parser.parse(''))
+
+
+class TestSyslog(unittest.TestCase):
+    def setUp(self):
+        self.parser = TimestampParser('syslog')
+
+    def test_past_date(self):
+        year = time.localtime().tm_year
+        self.assertEqual(
+            self.parser.parse('Jan  1 00:00:00'),
+            time.mktime((year, 1, 1, 0, 0, 0, 0, 0, -1))
+        )
+
+    def test_not_in_future(self):
+        self.assertLessEqual(self.parser.parse('Dec 31 23:59:59'), time.time() + 86400)
+
+    def test_invalid(self):
+        self.assertIsNone(self.parser.parse('Foo  2 03:04:05'))
+        self.assertIsNone(self.parser.parse('Jan 32 03:04:05'))
+        self.assertIsNone(self.parser.parse('Jan  2 25:04:05'))
+
+
+class TestClf(unittest.TestCase):
+    def setUp(self):
+        self.parser = TimestampParser('clf')
+
+    def test_offset(self):
+        self.assertEqual(
+            self.parser.parse('10/Oct/2000:13:55:36 -0700'),
+            calendar.timegm((2000, 10, 10, 20, 55, 36, 0, 0, 0))
+        )
+
+    def test_invalid(self):
+        self.assertIsNone(self.parser.parse('31/Feb/2000:13:55:36 -0700'))
+        self.assertIsNone(self.parser.parse('10/Foo/2000:13:55:36 -0700'))
+        self.assertIsNone(self.parser.parse('10/Oct/2000'))
+
+
+class TestStrptime(unittest.TestCase):
+    def test_local(self):
+        parser = TimestampParser('%d.%m.%Y %H:%M:%S')
+        self.assertEqual(
+            parser.parse('02.01.2016 03:04:05'),
+            time.mktime((2016, 1, 2, 3, 4, 5, 0, 0, -1))
+        )
+
+    def test_timezone(self):
+        parser = TimestampParser('%d/%b/%Y:%H:%M:%S.%f %z')
+        base = calendar.timegm((2000, 10, 10, 20, 55, 36, 0, 0, 0))
+        self.assertAlmostEqual(parser.parse('10/Oct/2000:13:55:36.250 -0700'), base + 0.25)
+
+    def test_fraction_cache(self):
+        parser = TimestampParser('%Y-%m-%d %H:%M:%S.%f')
+        base = time.mktime((2016, 1, 2, 3, 4, 5, 0, 0, -1))
+        self.assertAlmostEqual(parser.parse('2016-01-02 03:04:05.123456'), base + 0.123456)
+        self.assertAlmostEqual(parser.parse('2016-01-02 03:04:05.5'), base + 0.5)
+        self.assertAlmostEqual(parser.parse('2016-01-02 03:04:06.000001'), base + 1.000001)
+        self.assertEqual(len(parser._cache), 2)
+
+    def test_invalid(self):
+        parser = TimestampParser('%Y-%m-%d %H:%M:%S.%f')
+        self.assertIsNone(parser.parse('2016-01-02 03:04:05'))
+        self.assertIsNone(parser.parse('2016-02-30 03:04:05.1'))
+        self.assertIsNone(parser.parse('garbage'))
+
+
+class TestIsoformat(unittest.TestCase):
+    def test_isoformat(self):
+        parser = TimestampParser()
+        epoch = calendar.timegm((2016, 1, 2, 3, 4, 5, 0, 0, 0)) + 0.25
+        self.assertEqual(parser.isoformat(epoch), '2016-01-02T03:04:05.250Z')
+
+
+if __name__ == '__main__':
+    unittest.main()